@@ -27,25 +27,74 @@ Run:
 
 Requirements:
     pip install ultralytics opencv-python
+
+Optional:
+    pip install scipy   # optimal track assignment
+    pip install numba   # compiled tracker / line-side kernels
+    pip install onnxruntime   # --int8 on CPU
+    pip install cython   # compiled tracker (tracker_c.pyx, built on first run)
 """
 
 import argparse
+import atexit
+import queue
 import time
 import threading
-from collections import deque, defaultdict
+from collections import deque
 from dataclasses import dataclass
 from typing import Dict, Tuple, List
 import os
 import csv
+import math
+import shutil
+import subprocess
 
 import cv2
 import numpy as np
 
 try:
     from ultralytics import YOLO
+    try:
+        from ultralytics.utils.nms import non_max_suppression
+    except ImportError:  # older releases keep it in ops
+        from ultralytics.utils.ops import non_max_suppression
 except ImportError:
     YOLO = None
 
+try:
+    import torch
+except ImportError:
+    torch = None
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+try:
+    from numba import config as numba_config, njit, prange
+    # Parallel kernels run on the reader thread; the TBB layer can hang at exit when
+    # launched off the main thread, so prefer OpenMP / workqueue.
+    numba_config.THREADING_LAYER_PRIORITY = ["omp", "workqueue", "tbb"]
+except ImportError:
+    njit = None
+    prange = range
+
+try:
+    import pyximport
+
+    pyximport.install(setup_args={"include_dirs": np.get_include()}, language_level=3)
+    from tracker_c import FastTracker
+except ImportError:
+    FastTracker = None
+
+
+def _jit(**options):
+    # Compile with numba when available, otherwise leave the function as plain Python.
+    if njit is None:
+        return lambda fn: fn
+    return njit(**options)
+
 
 @dataclass
 class LineConfig:
@@ -71,104 +120,264 @@ class DrawConfig:
     thickness: int = 2
 
 
+# Integer side codes used by the compiled kernels (numba cannot take string args).
+SIDE_A, SIDE_B, SIDE_NEAR = 0, 1, 2
+
+
+@_jit(cache=True)
+def _centroids(boxes):
+    out = np.empty((boxes.shape[0], 2), dtype=np.int32)
+    for i in range(boxes.shape[0]):
+        out[i, 0] = (boxes[i, 0] + boxes[i, 2]) // 2
+        out[i, 1] = (boxes[i, 1] + boxes[i, 3]) // 2
+    return out
+
+
+@_jit(cache=True)
+def _pairwise_dists_kernel(det, trk):
+    out = np.empty((det.shape[0], trk.shape[0]), dtype=np.float32)
+    for i in range(det.shape[0]):
+        for j in range(trk.shape[0]):
+            dx = det[i, 0] - trk[j, 0]
+            dy = det[i, 1] - trk[j, 1]
+            out[i, j] = np.sqrt(dx * dx + dy * dy)
+    return out
+
+
+def _pairwise_dists(det, trk):
+    if njit is None:
+        return np.linalg.norm(det[:, None, :] - trk[None, :, :], axis=-1)
+    return _pairwise_dists_kernel(det, trk)
+
+
+def _greedy_match(D, max_distance):
+    # Fallback without scipy: take the closest remaining pair until it is out of range.
+    D = D.copy()
+    rows, cols = [], []
+    for _ in range(min(D.shape)):
+        di, ti = np.unravel_index(D.argmin(), D.shape)
+        if D[di, ti] > max_distance:
+            break
+        rows.append(di)
+        cols.append(ti)
+        D[di, :] = np.inf
+        D[:, ti] = np.inf
+    return np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)
+
+
+def _match(D, max_distance):
+    """Matched (rows, cols) of a detection x track distance matrix, all within max_distance.
+
+    Shared by CentroidTracker and the compiled FastTracker.
+    """
+    if linear_sum_assignment is None:
+        return _greedy_match(D, max_distance)
+    # Out-of-range pairs get a prohibitive cost so they cannot pull the
+    # optimal assignment away from in-range matches, then are dropped.
+    rows, cols = linear_sum_assignment(np.where(D > max_distance, 1e6, D))
+    keep = D[rows, cols] <= max_distance
+    return rows[keep], cols[keep]
+
+
 class CentroidTracker:
-    def __init__(self, max_distance=80, max_missed=10):
+    """Centroid tracker with tracks stored as parallel NumPy arrays indexed by slot."""
+
+    def __init__(self, max_distance=80, max_missed=10, capacity=64):
         self.next_id = 1
-        self.objects: Dict[int, Dict] = {}
         self.max_distance = max_distance
         self.max_missed = max_missed
+        self._tid = np.zeros(capacity, dtype=np.int32)
+        self._box = np.zeros((capacity, 4), dtype=np.int32)
+        self._cx = np.zeros(capacity, dtype=np.int32)
+        self._cy = np.zeros(capacity, dtype=np.int32)
+        self._missed = np.zeros(capacity, dtype=np.int32)
+        self._state = np.full(capacity, -1, dtype=np.int8)  # last side code, -1 = unknown
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._slot_of_tid: Dict[int, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+        self.history: Dict[int, deque] = {}
 
-    def _centroid(self, box):
-        x1, y1, x2, y2 = box
-        return ((x1 + x2) // 2, (y1 + y2) // 2)
-
-    def update(self, detections: List[Tuple[int, int, int, int]]):
-        cents = [self._centroid(b) for b in detections]
-        for tid in list(self.objects.keys()):
-            self.objects[tid]["missed"] += 1
-
-        used_tracks = set()
-        used_dets = set()
-        for di, det in enumerate(detections):
-            c = cents[di]
-            best_tid, best_dist = None, 1e9
-            for tid, obj in self.objects.items():
-                if tid in used_tracks:
-                    continue
-                oc = obj["centroid"]
-                dist = np.hypot(c[0] - oc[0], c[1] - oc[1])
-                if dist < best_dist:
-                    best_dist = dist
-                    best_tid = tid
-            if best_tid is not None and best_dist <= self.max_distance:
-                self.objects[best_tid].update({
-                    "box": det,
-                    "centroid": c,
-                    "missed": 0,
-                })
-                used_tracks.add(best_tid)
-                used_dets.add(di)
-
-        for di, det in enumerate(detections):
-            if di in used_dets:
-                continue
-            c = cents[di]
-            tid = self.next_id
-            self.next_id += 1
-            self.objects[tid] = {
-                "box": det,
-                "centroid": c,
-                "missed": 0,
-                "state": "unknown",
-                "last_side": None,
-                "history": deque(maxlen=8),
-            }
+    def __len__(self):
+        return len(self._slot_of_tid)
 
-        for tid in list(self.objects.keys()):
-            if self.objects[tid]["missed"] > self.max_missed:
-                del self.objects[tid]
+    def _grow(self):
+        cap = len(self._tid)
+        for name in ("_tid", "_box", "_cx", "_cy", "_missed", "_state", "_alive"):
+            old = getattr(self, name)
+            new = np.zeros((2 * cap,) + old.shape[1:], dtype=old.dtype)
+            new[:cap] = old
+            setattr(self, name, new)
+        self._state[cap:] = -1
+        self._free.extend(range(2 * cap - 1, cap - 1, -1))
 
-        return self.objects
+    def _add(self, box, cent):
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        tid = self.next_id
+        self.next_id += 1
+        self._tid[slot] = tid
+        self._box[slot] = box
+        self._cx[slot], self._cy[slot] = cent
+        self._missed[slot] = 0
+        self._state[slot] = -1
+        self._alive[slot] = True
+        self._slot_of_tid[tid] = slot
+        self.history[tid] = deque(maxlen=8)
+
+    def _remove(self, slots):
+        for slot in slots.tolist():
+            tid = int(self._tid[slot])
+            del self._slot_of_tid[tid]
+            del self.history[tid]
+            self._alive[slot] = False
+            self._free.append(slot)
+
+    def update(self, detections, centroids=None):
+        """Match (N, 4) xyxy detections to the current tracks.
+
+        `centroids` may be passed when the detector already computed them (e.g. from masks).
+        """
+        boxes = np.asarray(detections, dtype=np.int32).reshape(-1, 4)
+        if centroids is None:
+            cents = _centroids(boxes)
+        else:
+            cents = np.asarray(centroids, dtype=np.int32).reshape(-1, 2)
+        live = np.flatnonzero(self._alive)
+        self._missed[live] += 1
+
+        matched = np.zeros(len(boxes), dtype=bool)
+        if len(boxes) and len(live):
+            trk = np.stack([self._cx[live], self._cy[live]], axis=1).astype(np.float32)
+            D = _pairwise_dists(cents.astype(np.float32), trk)
+            rows, cols = _match(D, self.max_distance)
+            slots = live[cols]
+            self._box[slots] = boxes[rows]
+            self._cx[slots] = cents[rows, 0]
+            self._cy[slots] = cents[rows, 1]
+            self._missed[slots] = 0
+            matched[rows] = True
+
+        for di in np.flatnonzero(~matched).tolist():
+            self._add(boxes[di], cents[di])
+
+        self._remove(live[self._missed[live] > self.max_missed])
+
+        for slot in np.flatnonzero(self._alive & (self._missed == 0)).tolist():
+            self.history[int(self._tid[slot])].append((int(self._cx[slot]), int(self._cy[slot])))
+
+    def count_crossings(self, side_fn) -> Tuple[int, int]:
+        """Update the line side of every visible track and return (entries, exits).
+
+        `side_fn` comes from _make_side_fn. Crossing towards the far side
+        (below / right) of the line counts as an entry.
+        """
+        slots = np.flatnonzero(self._alive & (self._missed == 0))
+        if not len(slots):
+            return 0, 0
+        codes = side_fn(self._cx[slots], self._cy[slots])
+        last = self._state[slots]
+        decided = codes != SIDE_NEAR
+        crossed = decided & (last >= 0) & (last != codes)
+        self._state[slots[decided]] = codes[decided]
+        return int(np.count_nonzero(crossed & (codes == SIDE_B))), int(np.count_nonzero(crossed & (codes == SIDE_A)))
+
+    def tracks(self):
+        """Yield (tid, box, history) for the tracks matched in the last update."""
+        for slot in np.flatnonzero(self._alive & (self._missed == 0)).tolist():
+            tid = int(self._tid[slot])
+            yield tid, tuple(self._box[slot].tolist()), self.history[tid]
 
 
 class AlertManager:
     def __init__(self, cfg: AlertConfig):
         self.cfg = cfg
-        self.entry_events = deque()
-        self.exit_events = deque()
-        self.last_alert_time = defaultdict(lambda: 0.0)
-        self._lock = threading.Lock()
+        # Ring buffer of entry times still inside the burst window, from _entry_tail
+        # (oldest) up to _entry_head. Sized for `burst_threshold` entries and only
+        # grown when more than that land inside one window.
+        self._entry_ring = np.zeros(max(1, cfg.burst_threshold), dtype=np.int64)
+        self._entry_head = 0
+        self._entry_tail = 0
+        # All timing is integer nanoseconds from time.monotonic_ns().
+        self.burst_window_ns = int(cfg.burst_window_sec * 1e9)
+        self.cooldown_ns = int(cfg.cooldown_sec * 1e9)
+        self.last_alert_time: Dict[str, int] = {}
         self.log_file = "alerts_log.csv"
-        if not os.path.exists(self.log_file):
-            with open(self.log_file, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(["Timestamp", "Type", "Message"])
+        new_file = not os.path.exists(self.log_file)
+        # Kept open with a large buffer; flushed every second and on exit.
+        self._log_fh = open(self.log_file, "a", newline="", buffering=65536)
+        self._csv = csv.writer(self._log_fh)
+        if new_file:
+            self._csv.writerow(["Timestamp", "Type", "Message"])
+        self._flush_timer = None
+        self._schedule_flush()
+        # Snapshots are written by a background thread so disk I/O never stalls the
+        # detection loop; when it falls behind, new snapshots are dropped.
+        self._snap_q: queue.Queue = queue.Queue(maxsize=4)
+        self._snap_thread = threading.Thread(target=self._snapshot_writer, daemon=True)
+        self._snap_thread.start()
+        atexit.register(self.close)
+
+    def _snapshot_writer(self):
+        while True:
+            filename, frame = self._snap_q.get()
+            if filename is None:
+                return
+            cv2.imwrite(filename, frame)
+
+    def _schedule_flush(self):
+        self._flush_timer = threading.Timer(1.0, self._periodic_flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _periodic_flush(self):
+        if not self._log_fh.closed:
+            self.flush()
+            self._schedule_flush()
+
+    def flush(self):
+        try:
+            self._log_fh.flush()
+        except ValueError:  # closed concurrently
+            pass
+
+    def close(self):
+        if self._snap_thread.is_alive():
+            self._snap_q.put((None, None))  # finish pending snapshots, then stop
+            self._snap_thread.join()
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        if not self._log_fh.closed:
+            self._log_fh.close()
 
     def _rate_limited(self, key: str) -> bool:
-        now = time.time()
-        if now - self.last_alert_time[key] >= self.cfg.cooldown_sec:
+        now = time.monotonic_ns()
+        last = self.last_alert_time.get(key)
+        if last is None or now - last >= self.cooldown_ns:
             self.last_alert_time[key] = now
             return False
         return True
 
     def record_entry(self):
-        with self._lock:
-            self.entry_events.append(time.time())
+        # Only called from the tracking thread, so no lock is needed.
+        k = len(self._entry_ring)
+        if self._entry_head - self._entry_tail == k:
+            ring = np.zeros(2 * k, dtype=np.int64)
+            ring[:k] = np.roll(self._entry_ring, -(self._entry_tail % k))
+            self._entry_ring, self._entry_tail, self._entry_head = ring, 0, k
+        self._entry_ring[self._entry_head % len(self._entry_ring)] = time.monotonic_ns()
+        self._entry_head += 1
         self._log("ENTRY", "Entry detected")
 
     def record_exit(self):
-        with self._lock:
-            self.exit_events.append(time.time())
         self._log("EXIT", "Exit detected")
 
-    def _prune(self, deq: deque, window: float):
-        cutoff = time.time() - window
-        while deq and deq[0] < cutoff:
-            deq.popleft()
-
     def check_burst_alert(self, frame=None) -> Tuple[bool, int]:
-        self._prune(self.entry_events, self.cfg.burst_window_sec)
-        count = len(self.entry_events)
+        cutoff = time.monotonic_ns() - self.burst_window_ns
+        k = len(self._entry_ring)
+        while self._entry_tail < self._entry_head and self._entry_ring[self._entry_tail % k] < cutoff:
+            self._entry_tail += 1
+        count = self._entry_head - self._entry_tail
         if count >= self.cfg.burst_threshold:
             if not self._rate_limited("burst"):
                 msg = f"BURST ALERT: {count} entries in last {int(self.cfg.burst_window_sec)}s"
@@ -197,52 +406,503 @@ class AlertManager:
         if frame is not None:
             ts = time.strftime("%Y%m%d_%H%M%S")
             filename = f"alert_snapshot_{ts}.jpg"
-            cv2.imwrite(filename, frame)
+            try:
+                self._snap_q.put_nowait((filename, frame.copy()))
+            except queue.Full:
+                pass
 
     def _log(self, alert_type: str, message: str):
         timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        with open(self.log_file, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([timestamp, alert_type, message])
+        self._csv.writerow([timestamp, alert_type, message])
+
 
+def _make_side_fn(line: LineConfig):
+    """Side classifier specialized for `line` at config-parse time.
+
+    Orientation, position and hysteresis are baked into the compiled function,
+    which maps arrays of centroid xs and ys to SIDE_* codes.
+    """
+    lo = line.position - line.hysteresis
+    hi = line.position + line.hysteresis
 
-def side_of_line(line: LineConfig, centroid: Tuple[int, int]) -> str:
-    x, y = centroid
     if line.orientation == "horizontal":
-        if y < line.position - line.hysteresis:
-            return "above"
-        elif y > line.position + line.hysteresis:
-            return "below"
-        else:
-            return "near"
+        @_jit()
+        def side(cx, cy):
+            out = np.empty(cy.shape[0], dtype=np.int8)
+            for i in range(cy.shape[0]):
+                out[i] = SIDE_A if cy[i] < lo else (SIDE_B if cy[i] > hi else SIDE_NEAR)
+            return out
     else:
-        if x < line.position - line.hysteresis:
-            return "left"
-        elif x > line.position + line.hysteresis:
-            return "right"
+        @_jit()
+        def side(cx, cy):
+            out = np.empty(cx.shape[0], dtype=np.int8)
+            for i in range(cx.shape[0]):
+                out[i] = SIDE_A if cx[i] < lo else (SIDE_B if cx[i] > hi else SIDE_NEAR)
+            return out
+    return side
+
+
+class Overlay:
+    """HUD renderer that rasterizes the static parts (line and labels) once per frame size."""
+
+    LABELS = (("in", "Entered: ", (0, 255, 0)), ("out", "Exited : ", (0, 0, 255)), ("inside", "Inside : ", (255, 255, 255)))
+
+    def __init__(self, line_cfg: LineConfig, draw_cfg: DrawConfig):
+        self.line_cfg = line_cfg
+        self.draw_cfg = draw_cfg
+        self._shape = None
+        self._glyphs = self._render_digits()
+
+    def _render_digits(self):
+        # Pre-rasterized digit masks so the per-frame counters are blitted, not putText'd.
+        # Each entry is (mask, advance, ascent); the mask has `thickness` padding all round.
+        cfg = self.draw_cfg
+        pad = cfg.thickness
+        glyphs = {}
+        for c in "0123456789":
+            (adv, th), base = cv2.getTextSize(c, cv2.FONT_HERSHEY_SIMPLEX, cfg.font_scale, cfg.thickness)
+            img = np.zeros((th + base + 2 * pad, adv + 2 * pad), dtype=np.uint8)
+            cv2.putText(img, c, (pad, pad + th), cv2.FONT_HERSHEY_SIMPLEX, cfg.font_scale, 255, cfg.thickness)
+            glyphs[c] = (img >= 128, adv - cfg.thickness, pad + th)
+        return glyphs
+
+    def _blit_number(self, frame, value: int, org, color):
+        h, w = frame.shape[:2]
+        x, y = org
+        pad = self.draw_cfg.thickness
+        for c in str(value):
+            mask, adv, ascent = self._glyphs[c]
+            top, left = y - ascent, x - pad
+            ya, yb = max(top, 0), min(top + mask.shape[0], h)
+            xa, xb = max(left, 0), min(left + mask.shape[1], w)
+            if ya < yb and xa < xb:
+                frame[ya:yb, xa:xb][mask[ya - top:yb - top, xa - left:xb - left]] = color
+            x += adv
+
+    def _build(self, shape):
+        h, w = shape[:2]
+        cfg, line = self.draw_cfg, self.line_cfg
+        layer = np.zeros((h, w, 3), dtype=np.uint8)
+        pad = cfg.thickness + 1
+        if line.orientation == "horizontal":
+            cv2.line(layer, (0, line.position), (w, line.position), (0, 255, 255), 2)
+            rois = [(line.position - pad, line.position + pad, 0, w)]
         else:
-            return "near"
+            cv2.line(layer, (line.position, 0), (line.position, h), (0, 255, 255), 2)
+            rois = [(0, h, line.position - pad, line.position + pad)]
 
+        x0, y0 = 15, 30
+        self._value_org = {}
+        label_w = 0
+        for i, (key, label, color) in enumerate(self.LABELS):
+            y = y0 + 30 * i
+            cv2.putText(layer, label, (x0, y), cv2.FONT_HERSHEY_SIMPLEX, cfg.font_scale, color, cfg.thickness)
+            (tw, _), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, cfg.font_scale, cfg.thickness)
+            # getTextSize pads the width by `thickness`; the pen advance is without it.
+            self._value_org[key] = ((x0 + tw - cfg.thickness, y), color)
+            label_w = max(label_w, tw)
+        rois.append((0, y0 + 30 * len(self.LABELS), x0 - pad, x0 + label_w + pad))
 
-def draw_overlay(frame, line_cfg: LineConfig, counts, occupancy, alerts_text: List[str], draw_cfg: DrawConfig):
-    h, w = frame.shape[:2]
-    color = (0, 255, 255)
-    if line_cfg.orientation == "horizontal":
-        cv2.line(frame, (0, line_cfg.position), (w, line_cfg.position), color, 2)
-    else:
-        cv2.line(frame, (line_cfg.position, 0), (line_cfg.position, h), color, 2)
+        # Clip to the frame and keep only the pixels that were drawn.
+        self._rois = []
+        for ya, yb, xa, xb in rois:
+            ya, yb, xa, xb = max(ya, 0), min(yb, h), max(xa, 0), min(xb, w)
+            if ya < yb and xa < xb:
+                roi = layer[ya:yb, xa:xb]
+                self._rois.append((slice(ya, yb), slice(xa, xb), roi, roi.any(axis=2, keepdims=True)))
+        self._shape = shape
+
+    def draw(self, frame, counts, occupancy, alerts_text: List[str]):
+        if frame.shape != self._shape:
+            self._build(frame.shape)
+        for ys, xs, roi, mask in self._rois:
+            np.copyto(frame[ys, xs], roi, where=mask)
+
+        cfg = self.draw_cfg
+        values = {"in": counts["in"], "out": counts["out"], "inside": occupancy}
+        for key, (org, color) in self._value_org.items():
+            self._blit_number(frame, values[key], org, color)
+
+        x0, y = 15, 130
+        for t in alerts_text[-3:]:
+            timestamp = time.strftime("%H:%M:%S")
+            msg = f"[{timestamp}] {t}"
+            cv2.putText(frame, msg, (x0, y), cv2.FONT_HERSHEY_SIMPLEX, cfg.font_scale, (0, 140, 255), cfg.thickness)
+            y += 28
+
+
+@_jit(cache=True)
+def _half_bits(v):
+    # IEEE float16 bit pattern of v in [0, 1] (numba has no float16 on the CPU).
+    if v <= 0.0:
+        return np.uint16(0)
+    m, e = math.frexp(v)
+    exp = e + 14
+    if exp <= 0:
+        return np.uint16(int(v * 16777216.0 + 0.5))
+    mant = int((m * 2.0 - 1.0) * 1024.0 + 0.5)
+    if mant == 1024:
+        mant = 0
+        exp += 1
+    return np.uint16((exp << 10) | mant)
+
+
+def _letterbox(h: int, w: int, imgsz: int):
+    """Gain, resized (h, w) and (top, left) padding that fit an h x w frame into imgsz x imgsz.
 
-    x0, y0 = 15, 30
-    cv2.putText(frame, f"Entered: {counts['in']}", (x0, y0), cv2.FONT_HERSHEY_SIMPLEX, draw_cfg.font_scale, (0, 255, 0), draw_cfg.thickness)
-    cv2.putText(frame, f"Exited : {counts['out']}", (x0, y0 + 30), cv2.FONT_HERSHEY_SIMPLEX, draw_cfg.font_scale, (0, 0, 255), draw_cfg.thickness)
-    cv2.putText(frame, f"Inside : {occupancy}", (x0, y0 + 60), cv2.FONT_HERSHEY_SIMPLEX, draw_cfg.font_scale, (255, 255, 255), draw_cfg.thickness)
+    Same geometry as Ultralytics' LetterBox: aspect ratio kept, padding centred.
+    """
+    r = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    return r, nh, nw, (imgsz - nh) // 2, (imgsz - nw) // 2
 
-    y = y0 + 100
-    for t in alerts_text[-3:]:
-        timestamp = time.strftime("%H:%M:%S")
-        msg = f"[{timestamp}] {t}"
-        cv2.putText(frame, msg, (x0, y), cv2.FONT_HERSHEY_SIMPLEX, draw_cfg.font_scale, (0, 140, 255), draw_cfg.thickness)
-        y += 28
+
+@_jit(parallel=True, fastmath=True, cache=True)
+def _preprocess_frame(src, dst, nh, nw, top, left):
+    """Letterbox + BGR->RGB + /255 + HWC->CHW of one uint8 frame in a single pass.
+
+    The frame is bilinearly resized to nh x nw and placed at (top, left); the rest
+    of `dst`, a (3, H, W) float16 array viewed as uint16, is filled with grey 114.
+    """
+    h, w = src.shape[0], src.shape[1]
+    oh, ow = dst.shape[1], dst.shape[2]
+    ry, rx = h / nh, w / nw
+    pad = _half_bits(114.0 / 255.0)
+    for y in prange(oh):
+        if y < top or y >= top + nh:
+            for x in range(ow):
+                for c in range(3):
+                    dst[c, y, x] = pad
+            continue
+        fy = max((y - top + 0.5) * ry - 0.5, 0.0)
+        y0 = min(int(fy), h - 1)
+        y1 = min(y0 + 1, h - 1)
+        wy = fy - y0
+        for x in range(ow):
+            if x < left or x >= left + nw:
+                for c in range(3):
+                    dst[c, y, x] = pad
+                continue
+            fx = max((x - left + 0.5) * rx - 0.5, 0.0)
+            x0 = min(int(fx), w - 1)
+            x1 = min(x0 + 1, w - 1)
+            wx = fx - x0
+            for c in range(3):
+                sc = 2 - c
+                top_v = src[y0, x0, sc] * (1.0 - wx) + src[y0, x1, sc] * wx
+                bot_v = src[y1, x0, sc] * (1.0 - wx) + src[y1, x1, sc] * wx
+                dst[c, y, x] = _half_bits((top_v * (1.0 - wy) + bot_v * wy) * (1.0 / 255.0))
+
+
+def preprocess_batch(frames: List[np.ndarray], imgsz: int) -> np.ndarray:
+    """Letterbox, convert BGR->RGB and normalize frames into one float16 (K, 3, H, W) array."""
+    if njit is not None:
+        batch = np.empty((len(frames), 3, imgsz, imgsz), dtype=np.float16)
+        bits = batch.view(np.uint16)
+        for i, f in enumerate(frames):
+            _, nh, nw, top, left = _letterbox(f.shape[0], f.shape[1], imgsz)
+            _preprocess_frame(np.ascontiguousarray(f), bits[i], nh, nw, top, left)
+        return batch
+
+    padded = []
+    for f in frames:
+        _, nh, nw, top, left = _letterbox(f.shape[0], f.shape[1], imgsz)
+        img = cv2.resize(f, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        img = cv2.copyMakeBorder(img, top, imgsz - nh - top, left, imgsz - nw - left,
+                                 cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        padded.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    batch = np.ascontiguousarray(np.stack(padded).transpose(0, 3, 1, 2), dtype=np.float16)
+    batch *= 1.0 / 255.0
+    return batch
+
+
+def build_calibration_set(source, names, out_dir="calib", num_frames=200, stride=5) -> str:
+    """Save ~num_frames frames of `source` as an INT8 calibration dataset.
+
+    Every `stride`-th frame is kept so the set spans more of the scene. Returns
+    the path of the dataset yaml expected by the Ultralytics exporter.
+    """
+    import yaml
+
+    img_dir = os.path.join(out_dir, "images")
+    os.makedirs(img_dir, exist_ok=True)
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    saved = idx = 0
+    while saved < num_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if idx % stride == 0:
+            cv2.imwrite(os.path.join(img_dir, f"{saved:04d}.jpg"), frame)
+            saved += 1
+        idx += 1
+    cap.release()
+    if not saved:
+        raise RuntimeError(f"No calibration frames could be read from: {source}")
+
+    yaml_path = os.path.join(out_dir, "calib.yaml")
+    with open(yaml_path, "w") as f:
+        yaml.safe_dump({"path": os.path.abspath(out_dir), "train": "images", "val": "images", "names": names}, f)
+    return yaml_path
+
+
+def _export_onnx_int8(weights, out_path, calib_dir, batch=4, imgsz=640):
+    """Export to ONNX and statically quantize it to INT8 for onnxruntime on CPU."""
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    onnx_path = YOLO(weights).export(format="onnx", dynamic=False, batch=batch, imgsz=imgsz)
+    files = sorted(os.listdir(calib_dir))
+
+    class _Frames(CalibrationDataReader):
+        def __init__(self):
+            self.chunks = iter(range(0, len(files) - batch + 1, batch))
+
+        def get_next(self):
+            i = next(self.chunks, None)
+            if i is None:
+                return None
+            frames = [cv2.imread(os.path.join(calib_dir, f)) for f in files[i:i + batch]]
+            # The exported ONNX graph takes float32 input.
+            return {"images": preprocess_batch(frames, imgsz).astype(np.float32)}
+
+    quantize_static(
+        onnx_path,
+        out_path,
+        _Frames(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+
+def load_model(weights="yolov8n.pt", engine=None, batch=4, imgsz=640, int8=False, calib_source=None):
+    """Load YOLO weights, preferring a TensorRT FP16 engine when CUDA is available.
+
+    The engine is exported from `weights` on first use with a static
+    (batch, 3, imgsz, imgsz) input shape and reused on later runs. Without CUDA
+    the PyTorch weights are loaded as-is.
+
+    With int8 the engine is built in INT8 instead, calibrated on frames from
+    `calib_source`; without CUDA an INT8 ONNX model run by onnxruntime is used.
+    Returns the model and whether its batch size is fixed.
+    """
+    cuda = torch.cuda.is_available()
+    stem = os.path.splitext(weights)[0]
+    if int8 and not cuda:
+        onnx_int8 = f"{stem}_int8.onnx"
+        if not os.path.exists(onnx_int8):
+            build_calibration_set(calib_source, YOLO(weights).names)
+            _export_onnx_int8(weights, onnx_int8, os.path.join("calib", "images"), batch, imgsz)
+        return YOLO(onnx_int8, task="detect"), True
+
+    if int8 and not engine:
+        engine = f"{stem}_int8.engine"
+    if engine and cuda:
+        if not os.path.exists(engine):
+            opts = dict(format="engine", half=not int8, dynamic=False, batch=batch, imgsz=imgsz)
+            if int8:
+                opts.update(int8=True, data=build_calibration_set(calib_source, YOLO(weights).names))
+            exported = YOLO(weights).export(**opts)
+            if os.path.abspath(exported) != os.path.abspath(engine):
+                os.replace(exported, engine)
+        return YOLO(engine), True
+    return YOLO(weights), False
+
+
+class Detector:
+    def __init__(self, weights="yolov8n.pt", conf_thres=0.5, imgsz=640, engine=None, batch=4,
+                 int8=False, calib_source=None):
+        if YOLO is None or torch is None:
+            raise ImportError("ultralytics is required: pip install ultralytics")
+        self.model, static = load_model(weights, engine, batch, imgsz, int8, calib_source)
+        # Engines are built for exactly `batch` images; short batches get padded.
+        self.fixed_batch = batch if static else None
+        self.conf_thres = conf_thres
+        self.imgsz = imgsz
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        self.pinned = self.gpu_buf = self.stream = self.backend = None
+        if self.device == "cuda" and self.model.task == "detect":
+            # Page-locked staging buffer + device buffer allocated once, so each batch is a
+            # single async DMA instead of a synchronous copy from pageable memory.
+            shape = (batch, 3, imgsz, imgsz)
+            self.pinned = torch.empty(shape, dtype=torch.float16, pin_memory=True)
+            self.gpu_buf = torch.empty_like(self.pinned, device=self.device)
+            self.stream = torch.cuda.Stream()
+            # One predict() call sets up the predictor; afterwards its backend is called directly.
+            self.model.predict(torch.zeros(shape, device=self.device), half=True, verbose=False)
+            self.backend = self.model.predictor.model
+            # Same NMS settings predict() uses, so both paths return identical detections.
+            args = self.model.predictor.args
+            self.nms_kwargs = dict(iou_thres=args.iou, agnostic=args.agnostic_nms, max_det=args.max_det)
+            if hasattr(self.backend, "end2end"):  # older Ultralytics has no end-to-end heads
+                self.nms_kwargs["end2end"] = self.backend.end2end
+
+    def _frame_boxes(self, xyxy, frame: np.ndarray) -> np.ndarray:
+        # Undo the letterbox and round on the device so only the final int32 boxes cross to the host.
+        h, w = frame.shape[:2]
+        r, _, _, top, left = _letterbox(h, w, self.imgsz)
+        pad = torch.tensor([left, top, left, top], dtype=torch.float32, device=xyxy.device)
+        limit = torch.tensor([w, h, w, h], dtype=torch.float32, device=xyxy.device)
+        boxes = ((xyxy.float() - pad) / r).clamp_(min=0)
+        return torch.minimum(boxes, limit).to(torch.int32).cpu().numpy()
+
+    def _infer_pinned(self, batch: np.ndarray, frames: List[np.ndarray]):
+        n = len(batch)
+        np.copyto(self.pinned.numpy()[:n], batch)
+        # Static engines always take the full buffer; extra rows hold stale frames and are ignored.
+        rows = len(self.pinned) if self.fixed_batch else n
+        with torch.cuda.stream(self.stream):
+            self.gpu_buf[:n].copy_(self.pinned[:n], non_blocking=True)
+            im = self.gpu_buf[:rows]
+            preds = self.backend(im if self.backend.fp16 else im.float())
+            dets = non_max_suppression(preds, self.conf_thres, classes=[0], **self.nms_kwargs)
+            return [(self._frame_boxes(d[:, :4], f), None) for d, f in zip(dets, frames)]
+
+    def _mask_centroids(self, masks, xyxy, frame: np.ndarray):
+        # Boxes come from the detector; each instance's centroid is its mask's centre
+        # of mass, computed for all instances at once on the device. Instances are
+        # kept separate so people whose masks touch still count individually.
+        h, w = frame.shape[:2]
+        r, _, _, top, left = _letterbox(h, w, self.imgsz)
+        masks = masks.float()
+        area = masks.sum((1, 2))
+        ys = torch.arange(masks.shape[1], dtype=torch.float32, device=masks.device)
+        xs = torch.arange(masks.shape[2], dtype=torch.float32, device=masks.device)
+        cents = torch.stack([masks.sum(1) @ xs, masks.sum(2) @ ys], dim=1) / area.clamp(min=1).unsqueeze(1)
+        # An empty mask falls back to the centre of its box.
+        box_cents = (xyxy[:, :2] + xyxy[:, 2:4]).float() / 2
+        cents = torch.where((area > 0).unsqueeze(1), cents, box_cents)
+        pad = torch.tensor([left, top], dtype=torch.float32, device=masks.device)
+        cents = (cents - pad) / r
+        return self._frame_boxes(xyxy, frame), cents.to(torch.int32).cpu().numpy()
+
+    def __call__(self, frames: List[np.ndarray], batch: np.ndarray = None):
+        """Detect people in a batch of frames with a single forward pass.
+
+        `batch` is the output of preprocess_batch(frames) when it was already computed
+        by the reader thread. Returns one (boxes, centroids) pair per frame in frame
+        coordinates: boxes is an (N, 4) int32 xyxy array, centroids is an (N, 2) int32
+        array taken from the instance masks of segmentation models, or None.
+        """
+        if batch is None:
+            batch = preprocess_batch(frames, self.imgsz)
+        if self.pinned is not None:
+            return self._infer_pinned(batch, frames)
+
+        if self.fixed_batch and len(batch) < self.fixed_batch:
+            pad = np.zeros((self.fixed_batch - len(batch),) + batch.shape[1:], dtype=batch.dtype)
+            batch = np.concatenate([batch, pad])
+        batch = torch.from_numpy(batch).to(self.device, non_blocking=True)
+        batch = batch.contiguous(memory_format=torch.channels_last)
+        # classes=[0] drops non-person boxes inside NMS, before anything leaves the device.
+        results = self.model.predict(batch, conf=self.conf_thres, classes=[0], verbose=False)
+
+        out = []
+        for frame, r in zip(frames, results):
+            if r.masks is not None and len(r.boxes):
+                out.append(self._mask_centroids(r.masks.data, r.boxes.xyxy, frame))
+            else:
+                out.append((self._frame_boxes(r.boxes.xyxy, frame), None))
+        return out
+
+
+def _read_capture(cap):
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def _read_raw_frames(proc, width, height):
+    size = width * height * 3
+    try:
+        while True:
+            # Decode straight into a fresh array; frames outlive this loop in the pipeline queues.
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            view = memoryview(frame).cast("B")
+            n = 0
+            while n < size:
+                got = proc.stdout.readinto(view[n:])
+                if not got:
+                    return
+                n += got
+            yield frame
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def ffmpeg_frames(source, hwaccel="auto"):
+    """BGR frames decoded by an ffmpeg subprocess, hardware-accelerated when possible.
+
+    Returns (frames, abort): calling abort() from any thread kills the decoder,
+    which unblocks a reader waiting on a stalled stream.
+    """
+    net = ["-rtsp_transport", "tcp"] if str(source).startswith("rtsp://") else []
+    probe = subprocess.run(
+        ["ffprobe", "-v", "error", *net, "-select_streams", "v:0",
+         "-show_entries", "stream=width,height", "-of", "csv=p=0:s=x", str(source)],
+        capture_output=True, text=True,
+    )
+    if probe.returncode != 0 or "x" not in probe.stdout:
+        raise RuntimeError(f"Cannot open video source: {source}")
+    width, height = (int(v) for v in probe.stdout.strip().splitlines()[0].split("x")[:2])
+    # ffprobe reports the coded size, so keep ffmpeg from rotating frames to match rotation metadata.
+    cmd = ["ffmpeg", "-loglevel", "error", "-nostdin", *net, "-hwaccel", hwaccel, "-noautorotate",
+           "-i", str(source), "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=width * height * 3)
+    return _read_raw_frames(proc, width, height), proc.kill
+
+
+def open_frames(source, hwaccel="auto"):
+    """(frames, abort) for `source`: ffmpeg for files and streams when installed, OpenCV otherwise.
+
+    abort is None when a blocked read cannot be interrupted (cv2.VideoCapture).
+    """
+    if not str(source).isdigit() and shutil.which("ffmpeg") and shutil.which("ffprobe"):
+        return ffmpeg_frames(source, hwaccel)
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video source: {source}")
+    return _read_capture(cap), None
+
+
+def _put(q: queue.Queue, item, stop: threading.Event, drop_oldest=False) -> bool:
+    """Put into a bounded queue until it succeeds or the pipeline is stopped.
+
+    With drop_oldest the put never waits: the oldest queued item is discarded
+    instead, which keeps live sources real-time when inference falls behind.
+    """
+    while not stop.is_set():
+        try:
+            if drop_oldest:
+                q.put_nowait(item)
+            else:
+                q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            if drop_oldest:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """Get from a queue, returning None once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
 
 
 def run(
@@ -255,5 +915,178 @@ def run(
     burst_threshold=5,
     burst_window_sec=10.0,
     occupancy_limit=50,
-    cooldown_sec
+    cooldown_sec=15.0,
+    show=False,
+    batch=4,
+    imgsz=640,
+    engine=None,
+    int8=False,
+    hwaccel="auto",
+):
+    line_cfg = LineConfig(line_orientation, line_position, line_hyst)
+    side_fn = _make_side_fn(line_cfg)
+    alert_cfg = AlertConfig(burst_threshold, burst_window_sec, occupancy_limit, cooldown_sec)
+    draw_cfg = DrawConfig()
+    overlay = Overlay(line_cfg, draw_cfg)
+
+    detector = Detector(weights, conf_thres, imgsz=imgsz, engine=engine, batch=batch, int8=int8, calib_source=source)
+    # The Cython tracker when it builds; the NumPy one otherwise.
+    if FastTracker is not None:
+        tracker = FastTracker(_match, (SIDE_A, SIDE_B, SIDE_NEAR))
+    else:
+        tracker = CentroidTracker()
+    alert_mgr = AlertManager(alert_cfg)
+    counts = {"in": 0, "out": 0}
+    alerts_text: List[str] = []
+
+    def process(frame, dets) -> bool:
+        tracker.update(*dets)
+        entered, exited = tracker.count_crossings(side_fn)
+        counts["in"] += entered
+        counts["out"] += exited
+        for _ in range(entered):
+            alert_mgr.record_entry()
+        for _ in range(exited):
+            alert_mgr.record_exit()
+
+        occupancy = max(0, counts["in"] - counts["out"])
+        fired, burst_count = alert_mgr.check_burst_alert(frame)
+        if fired:
+            alerts_text.append(f"BURST: {burst_count} entries")
+        if alert_mgr.check_occupancy_alert(occupancy, frame):
+            alerts_text.append(f"OCCUPANCY: {occupancy}")
+
+        if not show:
+            return True
+
+        for tid, (x1, y1, x2, y2), history in tracker.tracks():
+            if draw_cfg.show_boxes:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+            if draw_cfg.show_ids:
+                cv2.putText(frame, f"ID {tid}", (x1, y1 - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+            if draw_cfg.show_tracks and len(history) > 1:
+                cv2.polylines(frame, [np.array(history, dtype=np.int32)], False, (255, 0, 255), 2)
+        overlay.draw(frame, counts, occupancy, alerts_text)
+        cv2.imshow("SmartPeopleCounter", frame)
+        return cv2.waitKey(1) & 0xFF != ord("q")
+
+    cv2.setNumThreads(1)
+    frame_src, abort_src = open_frames(source, hwaccel)
+    # Webcams and streams drop stale frames under load; files must keep every frame.
+    live = str(source).isdigit() or "://" in str(source)
+
+    # Capture/preprocess, inference and tracking/drawing run as overlapping stages.
+    # Drawing stays on the main thread since HighGUI windows need it.
+    frame_q: queue.Queue = queue.Queue(maxsize=2)
+    det_q: queue.Queue = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def reader():
+        try:
+            frames = []
+            while not stop.is_set():
+                frame = next(frame_src, None)
+                if frame is not None:
+                    frames.append(frame)
+                    if len(frames) < batch:
+                        continue
+                if frames:
+                    _put(frame_q, (frames, preprocess_batch(frames, imgsz)), stop, drop_oldest=live)
+                    frames = []
+                if frame is None:
+                    break
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            _put(frame_q, None, stop)
+
+    def infer():
+        try:
+            while True:
+                item = _get(frame_q, stop)
+                if item is None:
+                    break
+                frames, prep = item
+                _put(det_q, (frames, detector(frames, prep)), stop)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            _put(det_q, None, stop)
+
+    workers = [threading.Thread(target=reader, daemon=True), threading.Thread(target=infer, daemon=True)]
+    for t in workers:
+        t.start()
+
+    try:
+        while not stop.is_set():
+            item = _get(det_q, stop)
+            if item is None:
+                break
+            for frame, dets in zip(*item):
+                if not process(frame, dets):
+                    stop.set()
+                    break
+    finally:
+        stop.set()
+        # A stalled stream leaves the reader blocked in a read; kill the decoder first
+        # so it can see the stop. Workers are daemons, so one that still cannot be
+        # joined (e.g. an unplugged camera) is abandoned rather than hanging shutdown.
+        if abort_src is not None:
+            abort_src()
+        for t in workers:
+            t.join(timeout=2.0)
+        if not workers[0].is_alive():
+            frame_src.close()
+        alert_mgr.close()
+        if show:
+            cv2.destroyAllWindows()
+
+    if errors:
+        raise errors[0]
+
+    print(f"Entered: {counts['in']}  Exited: {counts['out']}")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="SmartPeopleCounter")
+    ap.add_argument("--source", default="0", help="Video source (index, file path, or RTSP/HTTP URL)")
+    ap.add_argument("--weights", default="yolov8n.pt", help="YOLOv8 model weights")
+    ap.add_argument("--conf", type=float, default=0.5, help="Confidence threshold for detections")
+    ap.add_argument("--line_orientation", choices=["horizontal", "vertical"], default="horizontal")
+    ap.add_argument("--line_position", type=int, default=300, help="Pixel position of the line")
+    ap.add_argument("--line_hyst", type=int, default=10, help="Hysteresis band to avoid bounce")
+    ap.add_argument("--burst_threshold", type=int, default=5, help="Entries within time to trigger burst alert")
+    ap.add_argument("--burst_window", type=float, default=10.0, help="Time window for burst alert (seconds)")
+    ap.add_argument("--occupancy_limit", type=int, default=50, help="Max people allowed inside")
+    ap.add_argument("--cooldown", type=float, default=15.0, help="Cooldown between repeated alerts (seconds)")
+    ap.add_argument("--batch", type=int, default=4, help="Frames per inference batch")
+    ap.add_argument("--imgsz", type=int, default=640, help="Network input size (multiple of 32)")
+    ap.add_argument("--engine", default=None, help="TensorRT engine path (exported from --weights if missing)")
+    ap.add_argument("--int8", action="store_true", help="INT8 inference (TensorRT on CUDA, onnxruntime on CPU)")
+    ap.add_argument("--hwaccel", default="auto", help="ffmpeg -hwaccel method for file/stream decoding (e.g. cuda, vaapi)")
+    ap.add_argument("--show", action="store_true", help="Show UI overlay in a window")
+    return ap.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(
+        args.source,
+        weights=args.weights,
+        conf_thres=args.conf,
+        line_orientation=args.line_orientation,
+        line_position=args.line_position,
+        line_hyst=args.line_hyst,
+        burst_threshold=args.burst_threshold,
+        burst_window_sec=args.burst_window,
+        occupancy_limit=args.occupancy_limit,
+        cooldown_sec=args.cooldown,
+        show=args.show,
+        batch=args.batch,
+        imgsz=args.imgsz,
+        engine=args.engine,
+        int8=args.int8,
+        hwaccel=args.hwaccel,
+    )
 ```